@@ -9,18 +9,256 @@ import time
 import socket
 import psutil
 import paho.mqtt.client as mqtt
-from datetime import datetime
 import logging
 import argparse
+import atexit
 import sys
+import signal
+import subprocess
+import threading
 import os
+import re
 import yaml
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+# Use the libyaml-based loader when PyYAML was built with it
+try:
+    from yaml import CSafeLoader as _YamlLoader
+except ImportError:
+    from yaml import SafeLoader as _YamlLoader
+
+# Use orjson for serialization when available (faster, and returns bytes)
+try:
+    import orjson
+    _dumps = orjson.dumps
+except ImportError:
+    def _dumps(obj):
+        return json.dumps(obj).encode()
 
 # Configure logging (will be updated based on config)
 logger = logging.getLogger(__name__)
 
+THERMAL_ZONE_PATH = '/sys/class/thermal/thermal_zone0/temp'
+
+# Pin level in pinctrl output, e.g. b"14: op -- pn | lo // GPIO14 = output"
+_PINCTRL_LEVEL_RE = re.compile(rb'\|\s+(hi|lo)\b', re.IGNORECASE)
+
+# All keys returned by get_system_metrics
+METRIC_KEYS = (
+    'cpu_percent', 'cpu_temp', 'load_avg',
+    'memory_percent', 'memory_used_gb', 'memory_total_gb',
+    'disk_percent', 'disk_used_gb', 'disk_total_gb',
+    'network_bytes_sent', 'network_bytes_recv',
+    'uptime_hours', 'fan_status', 'timestamp'
+)
+
+# /proc/meminfo fields needed to compute memory usage
+_MEMINFO_KEYS = frozenset((b'MemTotal', b'MemFree', b'MemAvailable'))
+
+# Supported values for the mqtt.protocol config option
+MQTT_PROTOCOLS = {
+    '3.1': mqtt.MQTTv31,
+    '3.1.1': mqtt.MQTTv311,
+    '5': mqtt.MQTTv5,
+}
+
+# Per-key topics that are published every cycle, even when unchanged
+ALWAYS_PUBLISH_KEYS = frozenset(('network_bytes_sent', 'network_bytes_recv'))
+
+# Home Assistant sensor definitions used for MQTT discovery
+SENSORS = [
+    {
+        "name": "CPU Usage",
+        "key": "cpu_percent",
+        "unit": "%",
+        "icon": "mdi:cpu-64-bit",
+        "device_class": None,
+        "state_class": "measurement"
+    },
+    {
+        "name": "CPU Temperature",
+        "key": "cpu_temp",
+        "unit": "°C",
+        "icon": "mdi:thermometer",
+        "device_class": "temperature",
+        "state_class": "measurement"
+    },
+    {
+        "name": "Load Average",
+        "key": "load_avg",
+        "unit": None,
+        "icon": "mdi:chart-line",
+        "device_class": None,
+        "state_class": "measurement"
+    },
+    {
+        "name": "Memory Usage",
+        "key": "memory_percent",
+        "unit": "%",
+        "icon": "mdi:memory",
+        "device_class": None,
+        "state_class": "measurement"
+    },
+    {
+        "name": "Memory Used",
+        "key": "memory_used_gb",
+        "unit": "GB",
+        "icon": "mdi:memory",
+        "device_class": None,
+        "state_class": "measurement"
+    },
+    {
+        "name": "Disk Usage",
+        "key": "disk_percent",
+        "unit": "%",
+        "icon": "mdi:harddisk",
+        "device_class": None,
+        "state_class": "measurement"
+    },
+    {
+        "name": "Disk Used",
+        "key": "disk_used_gb",
+        "unit": "GB",
+        "icon": "mdi:harddisk",
+        "device_class": None,
+        "state_class": "measurement"
+    },
+    {
+        "name": "Network Bytes Sent",
+        "key": "network_bytes_sent",
+        "unit": "B",
+        "icon": "mdi:upload-network",
+        "device_class": None,
+        "state_class": "total_increasing"
+    },
+    {
+        "name": "Network Bytes Received",
+        "key": "network_bytes_recv",
+        "unit": "B",
+        "icon": "mdi:download-network",
+        "device_class": None,
+        "state_class": "total_increasing"
+    },
+    {
+        "name": "Uptime",
+        "key": "uptime_hours",
+        "unit": "h",
+        "icon": "mdi:clock-outline",
+        "device_class": "duration",
+        "state_class": "total_increasing"
+    }
+]
+
+class ProcfsReader:
+    """Read CPU, memory and network stats directly from Linux procfs
+
+    Faster alternative to psutil: the files are kept open and re-read with
+    pread(), and only the fields the monitor publishes are parsed.
+    """
+
+    __slots__ = ('_stat_fd', '_meminfo_fd', '_net_dev_fd', '_last_cpu_times')
+
+    def __init__(self):
+        self._stat_fd = None
+        self._meminfo_fd = None
+        self._net_dev_fd = None
+        try:
+            self._stat_fd = os.open('/proc/stat', os.O_RDONLY)
+            self._meminfo_fd = os.open('/proc/meminfo', os.O_RDONLY)
+            self._net_dev_fd = os.open('/proc/net/dev', os.O_RDONLY)
+        except OSError:
+            self.close()
+            raise
+        atexit.register(self.close)
+
+        # Prime the CPU counters, like psutil.cpu_percent(interval=None)
+        self._last_cpu_times = self._read_cpu_times()
+
+    def close(self):
+        """Close the procfs file descriptors"""
+        for name in ('_stat_fd', '_meminfo_fd', '_net_dev_fd'):
+            fd = getattr(self, name)
+            if fd is not None:
+                os.close(fd)
+                setattr(self, name, None)
+
+    @staticmethod
+    def _read(fd):
+        """Read a whole procfs file from an open file descriptor"""
+        chunks = []
+        offset = 0
+        while True:
+            chunk = os.pread(fd, 8192, offset)
+            if not chunk:
+                return b''.join(chunks)
+            chunks.append(chunk)
+            offset += len(chunk)
+
+    def _read_cpu_times(self):
+        """Return (total, busy) CPU time from the first line of /proc/stat"""
+        line = os.pread(self._stat_fd, 256, 0).split(b'\n', 1)[0]
+        # cpu user nice system idle iowait irq softirq steal [guest guest_nice]
+        fields = [int(x) for x in line.split()[1:9]]
+        total = sum(fields)
+        # Same definition as psutil: idle and iowait are not busy time
+        busy = total - fields[3] - fields[4]
+        return total, busy
+
+    def cpu_percent(self, interval=None):
+        """CPU usage in percent since the previous call, or over interval seconds if given"""
+        if interval:
+            self._last_cpu_times = self._read_cpu_times()
+            time.sleep(interval)
+
+        total, busy = self._read_cpu_times()
+        last_total, last_busy = self._last_cpu_times
+        self._last_cpu_times = (total, busy)
+
+        total_delta = total - last_total
+        if total_delta <= 0:
+            return 0.0
+        return min(max((busy - last_busy) * 100 / total_delta, 0.0), 100.0)
+
+    def memory(self):
+        """Return (total, used, percent) memory usage, matching psutil.virtual_memory"""
+        values = {}
+        for line in self._read(self._meminfo_fd).splitlines():
+            key, _, rest = line.partition(b':')
+            if key in _MEMINFO_KEYS:
+                values[key] = int(rest.split()[0]) * 1024
+
+        total = values[b'MemTotal']
+        available = values.get(b'MemAvailable', values.get(b'MemFree', 0))
+        # Same definition as psutil >= 6.0: used is everything not available
+        used = total - available
+        percent = used * 100 / total if total else 0.0
+        return total, used, percent
+
+    def net_io(self):
+        """Return (bytes_sent, bytes_recv) summed over all interfaces"""
+        sent = 0
+        recv = 0
+        # Skip the two header lines; each line is "iface: rx_bytes ... tx_bytes ..."
+        for line in self._read(self._net_dev_fd).splitlines()[2:]:
+            fields = line.partition(b':')[2].split()
+            recv += int(fields[0])
+            sent += int(fields[8])
+        return sent, recv
+
+
 class SystemMonitor:
+    __slots__ = (
+        'mqtt_broker', 'mqtt_port', 'mqtt_user', 'mqtt_pass', 'mqtt_protocol',
+        'update_interval', 'ha_discovery', 'per_key_topics', 'discovery_pacing',
+        'fan_enabled', 'fan_gpio_pin', 'fan_direct_gpio', 'hostname', 'base_topic', 'client',
+        'discovery_sent', '_discovery_pending', '_fan_line', '_fan_value_fd',
+        '_pool', '_thermal_fd',
+        '_boot_time', '_disk_total_gb', '_sample_cache', '_sample_ttl',
+        '_state_topic', '_per_key_topics', '_discovery_payloads', '_last_published',
+        '_procfs', '_cpu_interval'
+    )
+
     def __init__(self, config, debug_override=False):
         # Configure logging based on config, but allow debug override
         if debug_override:
@@ -36,39 +274,136 @@ class SystemMonitor:
         self.mqtt_port = config['mqtt'].get('port', 1883)
         self.mqtt_user = config['mqtt'].get('username')
         self.mqtt_pass = config['mqtt'].get('password')
+        self.mqtt_protocol = str(config['mqtt'].get('protocol', '3.1.1'))
 
         # Monitor settings
         self.update_interval = config['monitor'].get('update_interval', 60)
         self.ha_discovery = config['monitor'].get('home_assistant_discovery', True)
+        self.per_key_topics = config['monitor'].get('per_key_topics', False)
+        self.discovery_pacing = (config['monitor'].get('discovery_pacing_ms') or 0) / 1000.0
 
         # GPIO settings for fan monitoring
         self.fan_enabled = config['monitor'].get('fan_monitoring', {}).get('enabled', False)
         self.fan_gpio_pin = config['monitor'].get('fan_monitoring', {}).get('gpio_pin', 14)
+        self.fan_direct_gpio = config['monitor'].get('fan_monitoring', {}).get('direct_gpio', False)
 
-        # Check if fan monitoring is possible
+        # Set up reading the fan GPIO pin. pinctrl only reads the pin, direct
+        # GPIO access is faster but opt-in, because gpiod claims the line.
+        self._fan_line = None
+        self._fan_value_fd = None
+        self._pool = None
         if self.fan_enabled:
-            self._check_pinctrl_availability()
+            if not (self.fan_direct_gpio and self._setup_fan_gpio()):
+                self._check_pinctrl_availability()
+
+            # pinctrl runs a subprocess, so read it in the background while
+            # the other metrics are collected
+            if self.fan_enabled and self._fan_line is None and self._fan_value_fd is None:
+                self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='fan-status')
 
         # Get hostname for topic structure
         self.hostname = socket.gethostname()
         self.base_topic = f"system_monitor/{self.hostname}"
+        self._state_topic = f"{self.base_topic}/state"
+        self._per_key_topics = {key: f"{self.base_topic}/{key}" for key in METRIC_KEYS}
 
         # MQTT client setup
-        self.client = mqtt.Client()
+        protocol = MQTT_PROTOCOLS.get(self.mqtt_protocol)
+        if protocol is None:
+            logger.warning(f"Unknown MQTT protocol version '{self.mqtt_protocol}', using 3.1.1")
+            protocol = mqtt.MQTTv311
+        self.client = mqtt.Client(protocol=protocol)
+        # Only affects QoS > 0 publishes; everything here is currently QoS 0
+        self.client.max_inflight_messages_set(100)
         if self.mqtt_user and self.mqtt_pass:
             self.client.username_pw_set(self.mqtt_user, self.mqtt_pass)
 
         self.client.on_connect = self.on_connect
         self.client.on_disconnect = self.on_disconnect
 
+        # Keep the thermal sysfs file open and re-read it with pread()
+        try:
+            self._thermal_fd = os.open(THERMAL_ZONE_PATH, os.O_RDONLY)
+            atexit.register(os.close, self._thermal_fd)
+        except OSError as e:
+            logger.warning(f"CPU temperature not available: {e}")
+            self._thermal_fd = None
+
+        # Values that do not change while the monitor is running
+        self._boot_time = psutil.boot_time()
+        st = os.statvfs('/')
+        self._disk_total_gb = round(st.f_blocks * st.f_frsize / (1024**3), 2)
+
+        # Short-lived cache for psutil readings, so rapid polling does not
+        # re-read /proc on every call
+        self._sample_cache = {}
+        self._sample_ttl = min(self.update_interval / 2, 1.0)
+
+        # The first CPU sample is measured over a short blocking interval,
+        # later ones report usage since the previous call (non-blocking)
+        self._cpu_interval = 0.1
+
+        # Optionally read CPU, memory and network stats straight from procfs
+        self._procfs = None
+        if config['monitor'].get('fast_procfs', False):
+            try:
+                self._procfs = ProcfsReader()
+            except OSError as e:
+                logger.warning(f"fast_procfs not available, using psutil: {e}")
+
+        # Discovery messages never change at runtime, so build them once
+        self._discovery_payloads = self._build_discovery_payloads()
+
         # Track discovery messages sent
         self.discovery_sent = False
+        # Set by on_connect; discovery is sent from the main loop so that
+        # discovery_pacing_ms really spaces the messages on the wire
+        self._discovery_pending = threading.Event()
 
+        # Last value published on each per-key topic
+        self._last_published = {}
+
+
+    def _setup_fan_gpio(self):
+        """Open the fan GPIO pin via libgpiod or sysfs, returns True on success"""
+        # libgpiod character device (python3-libgpiod, v1 API). Requesting
+        # the line claims it until it is released when the process exits.
+        chip = None
+        try:
+            import gpiod
+            chip = gpiod.Chip('gpiochip0')
+            line = chip.get_line(self.fan_gpio_pin)
+            # Keep the current direction, the fan pin is usually driven as output
+            line.request(consumer='system-monitor', type=gpiod.LINE_REQ_DIR_AS_IS)
+            atexit.register(chip.close)
+            atexit.register(line.release)
+            self._fan_line = line
+            logger.info(f"Fan monitoring enabled on GPIO pin {self.fan_gpio_pin} (using gpiod)")
+            return True
+        except ImportError:
+            logger.debug("gpiod module not available")
+        except Exception as e:
+            logger.debug(f"Could not open GPIO pin {self.fan_gpio_pin} with gpiod: {e}")
+            if chip is not None:
+                chip.close()
+
+        # Legacy sysfs GPIO interface, only if the pin is already exported.
+        # The pin is never exported here, so no GPIO state is left behind.
+        try:
+            self._fan_value_fd = os.open(f"/sys/class/gpio/gpio{self.fan_gpio_pin}/value", os.O_RDONLY)
+            atexit.register(os.close, self._fan_value_fd)
+            logger.info(f"Fan monitoring enabled on GPIO pin {self.fan_gpio_pin} (using sysfs)")
+            return True
+        except OSError as e:
+            logger.debug(f"Could not open GPIO pin {self.fan_gpio_pin} via sysfs: {e}")
+
+        logger.warning(f"Direct GPIO access not available for pin {self.fan_gpio_pin}, "
+                       "falling back to the slower pinctrl command")
+        return False
 
     def _check_pinctrl_availability(self):
         """Check if pinctrl is available for GPIO monitoring"""
         try:
-            import subprocess
             # Test if pinctrl command is available
             result = subprocess.run(['pinctrl', 'get', str(self.fan_gpio_pin)], 
                                   capture_output=True, text=True, timeout=5)
@@ -85,54 +420,96 @@ class SystemMonitor:
             self.fan_enabled = False
 
 
-    def on_connect(self, client, userdata, flags, rc):
+    def _cached(self, fn, key, ttl):
+        """Return fn(), reusing the previous result if it is younger than ttl seconds"""
+        now = time.monotonic()
+        entry = self._sample_cache.get(key)
+        if entry is not None and now - entry[0] < ttl:
+            return entry[1]
+
+        value = fn()
+        self._sample_cache[key] = (now, value)
+        return value
+
+    def on_connect(self, client, userdata, flags, rc, properties=None):
         if rc == 0:
             logger.info(f"Connected to MQTT broker at {self.mqtt_broker}:{self.mqtt_port}")
+            self._disable_nagle()
+            # Republish every per-key topic after (re)connecting
+            self._last_published.clear()
             if self.ha_discovery and not self.discovery_sent:
-                self.send_discovery_messages()
-                self.discovery_sent = True
+                self._discovery_pending.set()
         else:
             logger.error(f"Failed to connect to MQTT broker: {rc}")
 
-    def on_disconnect(self, client, userdata, rc):
+    def _disable_nagle(self):
+        """Send small MQTT packets immediately instead of letting Nagle delay them"""
+        sock = self.client.socket()
+        if sock is None:
+            return
+        try:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        except OSError as e:
+            logger.debug(f"Could not set TCP_NODELAY on MQTT socket: {e}")
+
+    def on_disconnect(self, client, userdata, rc, properties=None):
         logger.warning(f"Disconnected from MQTT broker: {rc}")
 
     def get_cpu_temperature(self):
         """Get CPU temperature (RPi specific)"""
+        if self._thermal_fd is None:
+            return None
+
         try:
-            with open('/sys/class/thermal/thermal_zone0/temp', 'r') as f:
-                temp = float(f.read().strip()) / 1000.0
-                return round(temp, 1)
-        except:
+            # Value is in millidegrees Celsius, e.g. b"48312\n"
+            return round(int(os.pread(self._thermal_fd, 16, 0)) / 1000.0, 1)
+        except (OSError, ValueError):
             return None
 
     def get_fan_status(self):
-        """Get fan status using pinctrl command"""
+        """Get fan status from the GPIO pin"""
         if not self.fan_enabled:
             return None
 
+        if self._fan_line is not None:
+            try:
+                return bool(self._fan_line.get_value())
+            except OSError as e:
+                logger.error(f"Error reading fan GPIO pin {self.fan_gpio_pin} with gpiod: {e}")
+                return None
+
+        if self._fan_value_fd is not None:
+            try:
+                return os.pread(self._fan_value_fd, 1, 0) == b'1'
+            except OSError as e:
+                logger.error(f"Error reading fan GPIO pin {self.fan_gpio_pin} via sysfs: {e}")
+                return None
+
+        return self._get_fan_status_pinctrl()
+
+    def _get_fan_status_pinctrl(self):
+        """Get fan status using pinctrl command"""
         try:
-            import subprocess
             result = subprocess.run(['pinctrl', 'get', str(self.fan_gpio_pin)], 
-                                  capture_output=True, text=True, timeout=5)
+                                  capture_output=True, timeout=5)
 
             if result.returncode == 0:
                 # Parse pinctrl output to get pin level
                 # Output format examples:
                 # "14: ip    -- | hi // GPIO14 = input"
                 # "14: op -- pn | lo // GPIO14 = output"
-                output = result.stdout.strip()
-                logger.debug(f"pinctrl output for pin {self.fan_gpio_pin}: {output}")
+                output = result.stdout
+                logger.debug(f"pinctrl output for pin {self.fan_gpio_pin}: {output!r}")
 
-                if '| hi' in output.lower():
-                    return True
-                elif '| lo' in output.lower():
-                    return False
+                match = _PINCTRL_LEVEL_RE.search(output)
+                if match:
+                    return match.group(1).lower() == b'hi'
                 else:
-                    logger.warning(f"Could not parse pinctrl output for pin {self.fan_gpio_pin}: {output}")
+                    logger.warning(f"Could not parse pinctrl output for pin {self.fan_gpio_pin}: "
+                                   f"{output.decode(errors='replace').strip()}")
                     return None
             else:
-                logger.error(f"pinctrl command failed: {result.stderr}")
+                logger.error(f"pinctrl command failed: {result.stderr.decode(errors='replace')}")
                 return None
 
         except subprocess.TimeoutExpired:
@@ -142,50 +519,75 @@ class SystemMonitor:
             logger.error(f"Error reading fan GPIO pin {self.fan_gpio_pin} with pinctrl: {e}")
             return None
 
+    def _get_disk_usage(self):
+        """Get used bytes and usage percentage of the root partition"""
+        # Same calculation as psutil.disk_usage, without the namedtuple wrapper:
+        # percentage is relative to the space available to non-root users
+        st = os.statvfs('/')
+        used = (st.f_blocks - st.f_bfree) * st.f_frsize
+        total_user = used + st.f_bavail * st.f_frsize
+        percent = used * 100 / total_user if total_user else 0.0
+        return used, percent
+
     def get_system_metrics(self):
         """Collect all system metrics"""
         metrics = {}
 
-        # CPU metrics
-        metrics['cpu_percent'] = round(psutil.cpu_percent(interval=1), 1)
+        # Start the slow pinctrl fan read first, so it overlaps with the rest
+        fan_future = None
+        if self.fan_enabled and self._pool is not None:
+            fan_future = self._pool.submit(self.get_fan_status)
+
+        # CPU metrics (usage since the previous call, i.e. over the update interval)
+        cpu_interval = self._cpu_interval
+        self._cpu_interval = None
+        if self._procfs is not None:
+            metrics['cpu_percent'] = round(self._procfs.cpu_percent(interval=cpu_interval), 1)
+        else:
+            metrics['cpu_percent'] = round(psutil.cpu_percent(interval=cpu_interval), 1)
         metrics['cpu_temp'] = self.get_cpu_temperature()
         metrics['load_avg'] = os.getloadavg()[0] if hasattr(os, 'getloadavg') else None
 
         # Memory metrics
-        memory = psutil.virtual_memory()
-        metrics['memory_percent'] = round(memory.percent, 1)
-        metrics['memory_used_gb'] = round(memory.used / (1024**3), 2)
-        metrics['memory_total_gb'] = round(memory.total / (1024**3), 2)
+        if self._procfs is not None:
+            mem_total, mem_used, mem_percent = self._cached(self._procfs.memory, 'memory', self._sample_ttl)
+        else:
+            memory = self._cached(psutil.virtual_memory, 'memory', self._sample_ttl)
+            mem_total, mem_used, mem_percent = memory.total, memory.used, memory.percent
+        metrics['memory_percent'] = round(mem_percent, 1)
+        metrics['memory_used_gb'] = round(mem_used / (1024**3), 2)
+        metrics['memory_total_gb'] = round(mem_total / (1024**3), 2)
 
         # Disk metrics (root partition)
-        disk = psutil.disk_usage('/')
-        metrics['disk_percent'] = round(disk.percent, 1)
-        metrics['disk_used_gb'] = round(disk.used / (1024**3), 2)
-        metrics['disk_total_gb'] = round(disk.total / (1024**3), 2)
+        disk_used, disk_percent = self._cached(self._get_disk_usage, 'disk', self._sample_ttl)
+        metrics['disk_percent'] = round(disk_percent, 1)
+        metrics['disk_used_gb'] = round(disk_used / (1024**3), 2)
+        metrics['disk_total_gb'] = self._disk_total_gb
 
         # Network metrics
-        net_io = psutil.net_io_counters()
-        metrics['network_bytes_sent'] = net_io.bytes_sent
-        metrics['network_bytes_recv'] = net_io.bytes_recv
+        if self._procfs is not None:
+            bytes_sent, bytes_recv = self._cached(self._procfs.net_io, 'network', self._sample_ttl)
+        else:
+            net_io = self._cached(psutil.net_io_counters, 'network', self._sample_ttl)
+            bytes_sent, bytes_recv = net_io.bytes_sent, net_io.bytes_recv
+        metrics['network_bytes_sent'] = bytes_sent
+        metrics['network_bytes_recv'] = bytes_recv
 
         # System uptime
-        boot_time = psutil.boot_time()
-        uptime_seconds = time.time() - boot_time
+        uptime_seconds = time.time() - self._boot_time
         metrics['uptime_hours'] = round(uptime_seconds / 3600, 1)
 
         # Fan status (if enabled)
         if self.fan_enabled:
-            metrics['fan_status'] = self.get_fan_status()
+            metrics['fan_status'] = fan_future.result() if fan_future else self.get_fan_status()
 
         # Timestamp
-        metrics['timestamp'] = datetime.now().isoformat()
+        metrics['timestamp'] = time.strftime('%Y-%m-%dT%H:%M:%S')
 
         return metrics
 
-    def send_discovery_messages(self):
-        """Send Home Assistant discovery messages for all sensors"""
-        logger.info("Sending Home Assistant discovery messages...")
-
+    def _build_discovery_payloads(self):
+        """Build the Home Assistant discovery messages as (topic, payload) tuples"""
         device_info = {
             "identifiers": [f"system_monitor_{self.hostname}"],
             "name": f"System Monitor {self.hostname}",
@@ -194,97 +596,21 @@ class SystemMonitor:
             "sw_version": "1.0.0"
         }
 
-        sensors = [
-            {
-                "name": "CPU Usage",
-                "key": "cpu_percent",
-                "unit": "%",
-                "icon": "mdi:cpu-64-bit",
-                "device_class": None,
-                "state_class": "measurement"
-            },
-            {
-                "name": "CPU Temperature",
-                "key": "cpu_temp",
-                "unit": "°C",
-                "icon": "mdi:thermometer",
-                "device_class": "temperature",
-                "state_class": "measurement"
-            },
-            {
-                "name": "Load Average",
-                "key": "load_avg",
-                "unit": None,
-                "icon": "mdi:chart-line",
-                "device_class": None,
-                "state_class": "measurement"
-            },
-            {
-                "name": "Memory Usage",
-                "key": "memory_percent",
-                "unit": "%",
-                "icon": "mdi:memory",
-                "device_class": None,
-                "state_class": "measurement"
-            },
-            {
-                "name": "Memory Used",
-                "key": "memory_used_gb",
-                "unit": "GB",
-                "icon": "mdi:memory",
-                "device_class": None,
-                "state_class": "measurement"
-            },
-            {
-                "name": "Disk Usage",
-                "key": "disk_percent",
-                "unit": "%",
-                "icon": "mdi:harddisk",
-                "device_class": None,
-                "state_class": "measurement"
-            },
-            {
-                "name": "Disk Used",
-                "key": "disk_used_gb",
-                "unit": "GB",
-                "icon": "mdi:harddisk",
-                "device_class": None,
-                "state_class": "measurement"
-            },
-            {
-                "name": "Network Bytes Sent",
-                "key": "network_bytes_sent",
-                "unit": "B",
-                "icon": "mdi:upload-network",
-                "device_class": None,
-                "state_class": "total_increasing"
-            },
-            {
-                "name": "Network Bytes Received",
-                "key": "network_bytes_recv",
-                "unit": "B",
-                "icon": "mdi:download-network",
-                "device_class": None,
-                "state_class": "total_increasing"
-            },
-            {
-                "name": "Uptime",
-                "key": "uptime_hours",
-                "unit": "h",
-                "icon": "mdi:clock-outline",
-                "device_class": "duration",
-                "state_class": "total_increasing"
-            }
-        ]
+        # Fields shared by every sensor config
+        base_config = {
+            "state_topic": self._state_topic,
+            "device": device_info
+        }
+        unique_id_prefix = f"system_monitor_{self.hostname}_"
 
-        for sensor in sensors:
+        payloads = []
+        for sensor in SENSORS:
             config = {
+                **base_config,
                 "name": f"{self.hostname} {sensor['name']}",
-                "unique_id": f"system_monitor_{self.hostname}_{sensor['key']}",
-                "state_topic": f"{self.base_topic}/state",
+                "unique_id": unique_id_prefix + sensor['key'],
                 "value_template": "{{ value_json." + sensor['key'] + " }}",
-                "icon": sensor['icon'],
-                "device": device_info
+                "icon": sensor['icon']
             }
 
             if sensor['unit']:
@@ -294,41 +620,73 @@ class SystemMonitor:
             if sensor['state_class']:
                 config["state_class"] = sensor['state_class']
 
-            discovery_topic = f"homeassistant/sensor/system_monitor_{self.hostname}_{sensor['key']}/config"
-
-            self.client.publish(discovery_topic, json.dumps(config), retain=True)
-            time.sleep(0.1)  # Small delay between messages
+            discovery_topic = f"homeassistant/sensor/{unique_id_prefix}{sensor['key']}/config"
+            payloads.append((discovery_topic, _dumps(config)))
 
         # Add fan binary sensor if enabled
         if self.fan_enabled:
             fan_config = {
+                **base_config,
                 "name": f"{self.hostname} Case Fan",
-                "unique_id": f"system_monitor_{self.hostname}_fan_status",
-                "state_topic": f"{self.base_topic}/state",
+                "unique_id": unique_id_prefix + "fan_status",
                 "value_template": "{% if value_json.fan_status %}ON{% else %}OFF{% endif %}",
                 "payload_on": "ON",
                 "payload_off": "OFF",
-                "icon": "mdi:fan",
-                "device": device_info
+                "icon": "mdi:fan"
             }
 
-            fan_discovery_topic = f"homeassistant/binary_sensor/system_monitor_{self.hostname}_fan_status/config"
-            self.client.publish(fan_discovery_topic, json.dumps(fan_config), retain=True)
-            time.sleep(0.1)
+            fan_discovery_topic = f"homeassistant/binary_sensor/{unique_id_prefix}fan_status/config"
+            payloads.append((fan_discovery_topic, _dumps(fan_config)))
+
+        return payloads
+
+    def send_discovery_messages(self):
+        """Send Home Assistant discovery messages for all sensors"""
+        logger.info("Sending Home Assistant discovery messages...")
+
+        for topic, payload in self._discovery_payloads:
+            self.client.publish(topic, payload, retain=True)
+            if self.discovery_pacing:
+                time.sleep(self.discovery_pacing)  # Optional delay for slow brokers
 
         logger.info("Home Assistant discovery messages sent")
 
+    def _wait_until(self, deadline):
+        """Sleep until deadline, sending discovery messages as soon as they are pending"""
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            if self._discovery_pending.wait(remaining):
+                self._discovery_pending.clear()
+                self.send_discovery_messages()
+                self.discovery_sent = True
+
     def publish_metrics(self, metrics):
-        """Publish metrics to MQTT"""
-        # Publish as single JSON payload
-        state_topic = f"{self.base_topic}/state"
-        self.client.publish(state_topic, json.dumps(metrics), retain=True)
+        """Publish metrics to MQTT, returns True if the state message was queued"""
+        # Publish as single JSON payload. With loop_start() running, QoS 0
+        # publishes are only queued for paho's network thread, so a slow
+        # broker never blocks sampling. Never wait_for_publish() here.
+        info = self.client.publish(self._state_topic, _dumps(metrics), qos=0, retain=True)
+        if info.rc != mqtt.MQTT_ERR_SUCCESS:
+            # Not connected (QoS 0 publishes only fail without a socket):
+            # drop this sample, the next one follows
+            logger.warning(f"Dropped metrics, publish failed: {mqtt.error_string(info.rc)}")
+            return False
+
+        # Optionally also publish individual metrics (one message per key),
+        # skipping values that have not changed since the last publish
+        if self.per_key_topics:
+            for key, value in metrics.items():
+                if value is None:
+                    continue
+                if key not in ALWAYS_PUBLISH_KEYS and self._last_published.get(key) == value:
+                    continue
+                info = self.client.publish(self._per_key_topics[key], str(value), retain=True)
+                if info.rc == mqtt.MQTT_ERR_SUCCESS:
+                    self._last_published[key] = value
 
-        # Also publish individual metrics for easier consumption
-        for key, value in metrics.items():
-            if value is not None:
-                topic = f"{self.base_topic}/{key}"
-                self.client.publish(topic, str(value), retain=True)
+        return True
 
     def run(self):
         """Main monitoring loop"""
@@ -337,10 +695,13 @@ class SystemMonitor:
             self.client.connect(self.mqtt_broker, self.mqtt_port, 60)
             self.client.loop_start()
 
+            # Schedule cycles against fixed deadlines so the time spent
+            # collecting and publishing does not add up to drift
+            deadline = time.monotonic()
             while True:
                 try:
                     metrics = self.get_system_metrics()
-                    self.publish_metrics(metrics)
+                    published = self.publish_metrics(metrics)
 
                     log_msg = (f"Published metrics: CPU={metrics['cpu_percent']}%, "
                               f"Temp={metrics['cpu_temp']}°C, "
@@ -352,9 +713,17 @@ class SystemMonitor:
                         fan_state = "ON" if metrics['fan_status'] else "OFF"
                         log_msg += f", Fan={fan_state}"
 
-                    logger.info(log_msg)
+                    if published:
+                        logger.info(log_msg)
 
-                    time.sleep(self.update_interval)
+                    deadline += self.update_interval
+                    now = time.monotonic()
+                    if deadline <= now:
+                        # Missed one or more deadlines: skip them rather than catch up
+                        missed = int((now - deadline) // self.update_interval) + 1
+                        deadline += missed * self.update_interval
+                        logger.debug(f"Skipped {missed} update interval(s)")
+                    self._wait_until(deadline)
 
                 except KeyboardInterrupt:
                     logger.info("Received interrupt signal, shutting down...")
@@ -362,19 +731,27 @@ class SystemMonitor:
                 except Exception as e:
                     logger.error(f"Error in monitoring loop: {e}")
                     time.sleep(10)  # Wait before retrying
+                    deadline = time.monotonic()
 
         except Exception as e:
             logger.error(f"Failed to start monitoring: {e}")
         finally:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False)
             self.client.loop_stop()
             self.client.disconnect()
             logger.info("System monitor stopped")
 
+def _handle_sigterm(signum, frame):
+    """Exit cleanly on SIGTERM (e.g. systemctl stop), so cleanup handlers run"""
+    logger.info("Received SIGTERM, shutting down...")
+    sys.exit(0)
+
 def load_config(config_file):
     """Load configuration from YAML file"""
     try:
         with open(config_file, 'r') as f:
-            config = yaml.safe_load(f)
+            config = yaml.load(f, Loader=_YamlLoader)
 
         # Validate required sections
         if 'mqtt' not in config:
@@ -407,12 +784,21 @@ def create_sample_config(config_file):
         ('mqtt', OrderedDict([
             ('broker', '192.168.1.100'),
             ('port', 1883),
+            ('protocol', '3.1.1'),  # 3.1, 3.1.1 or 5
             ('username', None),  # Optional
             ('password', None)   # Optional
         ])),
         ('monitor', OrderedDict([
             ('update_interval', 60),
-            ('home_assistant_discovery', True)
+            ('home_assistant_discovery', True),
+            ('per_key_topics', False),
+            ('discovery_pacing_ms', 0),
+            ('fast_procfs', False),
+            ('fan_monitoring', OrderedDict([
+                ('enabled', False),
+                ('gpio_pin', 14),
+                ('direct_gpio', False)
+            ]))
         ])),
         ('logging', OrderedDict([
             ('level', 'INFO')  # DEBUG, INFO, WARNING, ERROR, CRITICAL
@@ -491,6 +877,8 @@ def main():
     if args.no_discovery:
         config['monitor']['home_assistant_discovery'] = False
 
+    signal.signal(signal.SIGTERM, _handle_sigterm)
+
     monitor = SystemMonitor(config, debug_override=args.debug)
     monitor.run()
 